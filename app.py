@@ -1,91 +1,84 @@
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import hashlib
 import json
 import os
+import re
 from werkzeug.utils import secure_filename
 import sqlite3
+import threading
+from db_router import (
+    DATABASE, PARTITIONED, create_tables, data_token, fetch_by_ids, init_catalog,
+    insert_row, load_partitioned, scatter, scatter_rows, shard_for_city, shard_for_id
+)
 
 app = Flask(__name__)
 app.secret_key = 'food_wastage_management_secret_key'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 
+# Analytics chart data is cached until any process next writes to the database
+CHART_CACHE_SIZE = 32
+chart_cache = {}
+chart_cache_lock = threading.Lock()
+
 # Database setup
 def init_db():
     """Initialize SQLite database"""
-    conn = sqlite3.connect('food_wastage.db')
+    if PARTITIONED:
+        # Data tables are created per shard as cities are onboarded
+        init_catalog()
+        return
+
+    conn = sqlite3.connect(DATABASE)
     cursor = conn.cursor()
     
     # Create tables
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS providers (
-            provider_id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            type TEXT NOT NULL,
-            address TEXT,
-            city TEXT,
-            contact TEXT,
-            email TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS receivers (
-            receiver_id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            type TEXT NOT NULL,
-            city TEXT,
-            contact TEXT,
-            email TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS food_listings (
-            food_id INTEGER PRIMARY KEY,
-            food_name TEXT NOT NULL,
-            quantity INTEGER NOT NULL,
-            expiry_date DATE NOT NULL,
-            provider_id INTEGER,
-            provider_type TEXT,
-            location TEXT,
-            food_type TEXT,
-            meal_type TEXT,
-            description TEXT,
-            status TEXT DEFAULT 'Available',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (provider_id) REFERENCES providers (provider_id)
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS claims (
-            claim_id INTEGER PRIMARY KEY,
-            food_id INTEGER,
-            receiver_id INTEGER,
-            status TEXT DEFAULT 'Pending',
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            notes TEXT,
-            FOREIGN KEY (food_id) REFERENCES food_listings (food_id),
-            FOREIGN KEY (receiver_id) REFERENCES receivers (receiver_id)
-        )
-    ''')
+    create_tables(cursor)
     
     conn.commit()
     conn.close()
 
+def read_unpartitioned_data():
+    """Read the data tables left in the main database by single-file mode
+
+    Returns the four tables as DataFrames, or None if there is nothing to
+    migrate.
+    """
+    conn = sqlite3.connect(DATABASE)
+    cursor = conn.cursor()
+    
+    tables = ['providers', 'receivers', 'food_listings', 'claims']
+    cursor.execute("""
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'table' AND name IN (?, ?, ?, ?)
+    """, tables)
+    if cursor.fetchone()[0] < len(tables):
+        conn.close()
+        return None
+    
+    frames = [pd.read_sql_query(f"SELECT * FROM {table}", conn) for table in tables]
+    conn.close()
+    
+    if all(frame.empty for frame in frames):
+        return None
+    return frames
+
 # Load data from CSV files
 def load_initial_data():
     """Load initial data from CSV files if database is empty"""
-    conn = sqlite3.connect('food_wastage.db')
-    
     # Check if tables are empty
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM providers")
-    if cursor.fetchone()[0] == 0:
+    if sum(row[0] for row in scatter_rows("SELECT COUNT(*) FROM providers")) == 0:
+        # An existing single-file deployment switching to partitioned mode
+        # keeps its data instead of being re-seeded
+        if PARTITIONED:
+            existing_frames = read_unpartitioned_data()
+            if existing_frames is not None:
+                load_partitioned(*existing_frames)
+                print("Existing data migrated into partitioned shards!")
+                return
+        
         # Load data from CSV files
         try:
             providers_df = pd.read_csv('Dataset/providers_data.csv')
@@ -94,78 +87,81 @@ def load_initial_data():
             claims_df = pd.read_csv('Dataset/claims_data.csv')
             
             # Insert data into database
-            providers_df.to_sql('providers', conn, if_exists='append', index=False)
-            receivers_df.to_sql('receivers', conn, if_exists='append', index=False)
-            food_listings_df.to_sql('food_listings', conn, if_exists='append', index=False)
-            claims_df.to_sql('claims', conn, if_exists='append', index=False)
+            if PARTITIONED:
+                load_partitioned(providers_df, receivers_df, food_listings_df, claims_df)
+            else:
+                conn = sqlite3.connect(DATABASE)
+                providers_df.to_sql('providers', conn, if_exists='append', index=False)
+                receivers_df.to_sql('receivers', conn, if_exists='append', index=False)
+                food_listings_df.to_sql('food_listings', conn, if_exists='append', index=False)
+                claims_df.to_sql('claims', conn, if_exists='append', index=False)
+                conn.close()
             
             print("Initial data loaded successfully!")
         except FileNotFoundError:
             print("CSV files not found. Starting with empty database.")
-    
-    conn.close()
 
 # Initialize database on startup
 init_db()
 load_initial_data()
 
+def merge_counts(row_lists):
+    """Sum (key, count) rows gathered from several shards into one dict"""
+    merged = {}
+    for rows in row_lists:
+        for key, count in rows:
+            merged[key] = merged.get(key, 0) + count
+    return merged
+
 @app.route('/')
 def index():
     """Home page with dashboard"""
-    conn = sqlite3.connect('food_wastage.db')
-    
-    # Get dashboard statistics
-    cursor = conn.cursor()
-    
-    # Total counts
-    cursor.execute("SELECT COUNT(*) FROM providers")
-    total_providers = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM receivers")
-    total_receivers = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM food_listings WHERE status = 'Available'")
-    available_food_items = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM claims WHERE status = 'Completed'")
-    successful_claims = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM claims WHERE status = 'Pending'")
-    pending_claims = cursor.fetchone()[0]
-    
-    # Total food quantity available
-    cursor.execute("SELECT SUM(quantity) FROM food_listings WHERE status = 'Available'")
-    total_quantity = cursor.fetchone()[0] or 0
-    
     # Food expiring soon (within 3 days)
     three_days_from_now = (datetime.now() + timedelta(days=3)).strftime('%Y-%m-%d')
-    cursor.execute("""
-        SELECT COUNT(*) FROM food_listings 
-        WHERE expiry_date <= ? AND status = 'Available'
-    """, (three_days_from_now,))
-    expiring_soon = cursor.fetchone()[0]
-    
-    # Recent claims
-    cursor.execute("""
-        SELECT c.claim_id, f.food_name, r.name, c.status, c.timestamp
-        FROM claims c
-        JOIN food_listings f ON c.food_id = f.food_id
-        JOIN receivers r ON c.receiver_id = r.receiver_id
-        ORDER BY c.timestamp DESC LIMIT 5
-    """)
-    recent_claims = cursor.fetchall()
     
-    conn.close()
+    def shard_stats(cursor):
+        # Total counts, available quantity and food expiring soon
+        cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM providers),
+                (SELECT COUNT(*) FROM receivers),
+                (SELECT COUNT(*) FROM food_listings WHERE status = 'Available'),
+                (SELECT COUNT(*) FROM claims WHERE status = 'Completed'),
+                (SELECT COUNT(*) FROM claims WHERE status = 'Pending'),
+                (SELECT SUM(quantity) FROM food_listings WHERE status = 'Available'),
+                (SELECT COUNT(*) FROM food_listings
+                 WHERE expiry_date <= ? AND status = 'Available')
+        """, (three_days_from_now,))
+        counts = cursor.fetchone()
+        
+        # Recent claims
+        cursor.execute("""
+            SELECT c.claim_id, f.food_name, c.receiver_id, c.status, c.timestamp
+            FROM claims c
+            JOIN food_listings f ON c.food_id = f.food_id
+            ORDER BY c.timestamp DESC LIMIT 5
+        """)
+        return counts, cursor.fetchall()
+    
+    # Get dashboard statistics from every shard
+    results = scatter(shard_stats)
+    totals = [sum(counts[i] or 0 for counts, _ in results) for i in range(7)]
+    
+    recent_rows = [row for _, rows in results for row in rows]
+    receiver_names = fetch_by_ids('receivers', 'receiver_id', [row[2] for row in recent_rows], ['name'])
+    recent_claims = [row[:2] + receiver_names[row[2]] + row[3:]
+                     for row in recent_rows if row[2] in receiver_names]
+    recent_claims.sort(key=lambda row: row[4] or '', reverse=True)
     
     stats = {
-        'total_providers': total_providers,
-        'total_receivers': total_receivers,
-        'available_food_items': available_food_items,
-        'successful_claims': successful_claims,
-        'pending_claims': pending_claims,
-        'total_quantity': total_quantity,
-        'expiring_soon': expiring_soon,
-        'recent_claims': recent_claims
+        'total_providers': totals[0],
+        'total_receivers': totals[1],
+        'available_food_items': totals[2],
+        'successful_claims': totals[3],
+        'pending_claims': totals[4],
+        'total_quantity': totals[5],
+        'expiring_soon': totals[6],
+        'recent_claims': recent_claims[:5]
     }
     
     return render_template('index.html', stats=stats)
@@ -173,13 +169,8 @@ def index():
 @app.route('/providers')
 def providers():
     """List all providers"""
-    conn = sqlite3.connect('food_wastage.db')
-    cursor = conn.cursor()
+    providers_list = sorted(scatter_rows("SELECT * FROM providers"), key=lambda row: row[1])
     
-    cursor.execute("SELECT * FROM providers ORDER BY name")
-    providers_list = cursor.fetchall()
-    
-    conn.close()
     return render_template('providers.html', providers=providers_list)
 
 @app.route('/providers/add', methods=['GET', 'POST'])
@@ -193,13 +184,18 @@ def add_provider():
         contact = request.form['contact']
         email = request.form['email']
         
-        conn = sqlite3.connect('food_wastage.db')
+        shard = shard_for_city(city)
+        conn = shard.connect()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            INSERT INTO providers (name, type, address, city, contact, email)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (name, provider_type, address, city, contact, email))
+        insert_row(cursor, shard, 'providers', 'provider_id', {
+            'name': name,
+            'type': provider_type,
+            'address': address,
+            'city': city,
+            'contact': contact,
+            'email': email
+        })
         
         conn.commit()
         conn.close()
@@ -212,13 +208,8 @@ def add_provider():
 @app.route('/receivers')
 def receivers():
     """List all receivers"""
-    conn = sqlite3.connect('food_wastage.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM receivers ORDER BY name")
-    receivers_list = cursor.fetchall()
+    receivers_list = sorted(scatter_rows("SELECT * FROM receivers"), key=lambda row: row[1])
     
-    conn.close()
     return render_template('receivers.html', receivers=receivers_list)
 
 @app.route('/receivers/add', methods=['GET', 'POST'])
@@ -231,13 +222,17 @@ def add_receiver():
         contact = request.form['contact']
         email = request.form['email']
         
-        conn = sqlite3.connect('food_wastage.db')
+        shard = shard_for_city(city)
+        conn = shard.connect()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            INSERT INTO receivers (name, type, city, contact, email)
-            VALUES (?, ?, ?, ?, ?)
-        """, (name, receiver_type, city, contact, email))
+        insert_row(cursor, shard, 'receivers', 'receiver_id', {
+            'name': name,
+            'type': receiver_type,
+            'city': city,
+            'contact': contact,
+            'email': email
+        })
         
         conn.commit()
         conn.close()
@@ -250,18 +245,14 @@ def add_receiver():
 @app.route('/food_listings')
 def food_listings():
     """List all food items"""
-    conn = sqlite3.connect('food_wastage.db')
-    cursor = conn.cursor()
-    
     # Get filter parameters
     food_type = request.args.get('food_type', '')
     status = request.args.get('status', '')
     expiring_soon = request.args.get('expiring_soon', '')
     
     query = """
-        SELECT f.*, p.name as provider_name
+        SELECT f.*
         FROM food_listings f
-        LEFT JOIN providers p ON f.provider_id = p.provider_id
         WHERE 1=1
     """
     params = []
@@ -279,16 +270,16 @@ def food_listings():
         query += " AND f.expiry_date <= ?"
         params.append(three_days_from_now)
     
-    query += " ORDER BY f.expiry_date"
+    rows = sorted(scatter_rows(query, params), key=lambda row: row[3])
     
-    cursor.execute(query, params)
-    food_items = cursor.fetchall()
+    # Providers may live on another shard, so resolve names by id
+    provider_names = fetch_by_ids('providers', 'provider_id', [row[4] for row in rows], ['name'])
+    food_items = [row + provider_names.get(row[4], (None,)) for row in rows]
     
     # Get filter options
-    cursor.execute("SELECT DISTINCT food_type FROM food_listings")
-    food_types = [row[0] for row in cursor.fetchall()]
-    
-    conn.close()
+    food_types = list(dict.fromkeys(
+        row[0] for row in scatter_rows("SELECT DISTINCT food_type FROM food_listings")
+    ))
     
     return render_template('food_listings.html', 
                          food_items=food_items, 
@@ -310,20 +301,24 @@ def add_food_listing():
         meal_type = request.form['meal_type']
         description = request.form['description']
         
-        conn = sqlite3.connect('food_wastage.db')
-        cursor = conn.cursor()
-        
         # Get provider type
-        cursor.execute("SELECT type FROM providers WHERE provider_id = ?", (provider_id,))
-        provider_type = cursor.fetchone()[0]
+        provider_type = fetch_by_ids('providers', 'provider_id', [provider_id], ['type'])[provider_id][0]
         
-        cursor.execute("""
-            INSERT INTO food_listings 
-            (food_name, quantity, expiry_date, provider_id, provider_type, 
-             location, food_type, meal_type, description)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (food_name, quantity, expiry_date, provider_id, provider_type, 
-              location, food_type, meal_type, description))
+        shard = shard_for_city(location)
+        conn = shard.connect()
+        cursor = conn.cursor()
+        
+        insert_row(cursor, shard, 'food_listings', 'food_id', {
+            'food_name': food_name,
+            'quantity': quantity,
+            'expiry_date': expiry_date,
+            'provider_id': provider_id,
+            'provider_type': provider_type,
+            'location': location,
+            'food_type': food_type,
+            'meal_type': meal_type,
+            'description': description
+        })
         
         conn.commit()
         conn.close()
@@ -332,28 +327,21 @@ def add_food_listing():
         return redirect(url_for('food_listings'))
     
     # Get providers for dropdown
-    conn = sqlite3.connect('food_wastage.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT provider_id, name FROM providers ORDER BY name")
-    providers_list = cursor.fetchall()
-    conn.close()
+    providers_list = sorted(scatter_rows("SELECT provider_id, name FROM providers"),
+                            key=lambda row: row[1])
     
     return render_template('add_food_listing.html', providers=providers_list)
 
 @app.route('/claims')
 def claims():
     """List all claims"""
-    conn = sqlite3.connect('food_wastage.db')
-    cursor = conn.cursor()
-    
     status_filter = request.args.get('status', '')
     
     query = """
-        SELECT c.claim_id, f.food_name, f.quantity, r.name as receiver_name,
-               r.type as receiver_type, c.status, c.timestamp, c.notes
+        SELECT c.claim_id, f.food_name, f.quantity, c.receiver_id,
+               c.status, c.timestamp, c.notes
         FROM claims c
         JOIN food_listings f ON c.food_id = f.food_id
-        JOIN receivers r ON c.receiver_id = r.receiver_id
     """
     
     params = []
@@ -361,12 +349,14 @@ def claims():
         query += " WHERE c.status = ?"
         params.append(status_filter)
     
-    query += " ORDER BY c.timestamp DESC"
+    rows = scatter_rows(query, params)
     
-    cursor.execute(query, params)
-    claims_list = cursor.fetchall()
+    # Receivers may live on another shard, so resolve them by id
+    receivers_by_id = fetch_by_ids('receivers', 'receiver_id', [row[3] for row in rows], ['name', 'type'])
+    claims_list = [row[:3] + receivers_by_id[row[3]] + row[4:]
+                   for row in rows if row[3] in receivers_by_id]
+    claims_list.sort(key=lambda row: row[6] or '', reverse=True)
     
-    conn.close()
     return render_template('claims.html', claims=claims_list, selected_status=status_filter)
 
 @app.route('/claims/add', methods=['GET', 'POST'])
@@ -377,13 +367,20 @@ def add_claim():
         receiver_id = int(request.form['receiver_id'])
         notes = request.form.get('notes', '')
         
-        conn = sqlite3.connect('food_wastage.db')
+        # Claims are stored alongside the food they claim
+        try:
+            shard = shard_for_id(food_id)
+        except KeyError:
+            flash('Food item not found!', 'error')
+            return redirect(url_for('add_claim'))
+        conn = shard.connect()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            INSERT INTO claims (food_id, receiver_id, notes)
-            VALUES (?, ?, ?)
-        """, (food_id, receiver_id, notes))
+        insert_row(cursor, shard, 'claims', 'claim_id', {
+            'food_id': food_id,
+            'receiver_id': receiver_id,
+            'notes': notes
+        })
         
         conn.commit()
         conn.close()
@@ -392,22 +389,19 @@ def add_claim():
         return redirect(url_for('claims'))
     
     # Get available food items and receivers
-    conn = sqlite3.connect('food_wastage.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT f.food_id, f.food_name, f.quantity, f.expiry_date, p.name as provider_name
+    rows = scatter_rows("""
+        SELECT f.food_id, f.food_name, f.quantity, f.expiry_date, f.provider_id
         FROM food_listings f
-        JOIN providers p ON f.provider_id = p.provider_id
         WHERE f.status = 'Available'
-        ORDER BY f.expiry_date
     """)
-    available_food = cursor.fetchall()
-    
-    cursor.execute("SELECT receiver_id, name, type FROM receivers ORDER BY name")
-    receivers_list = cursor.fetchall()
+    provider_names = fetch_by_ids('providers', 'provider_id', [row[4] for row in rows], ['name'])
+    available_food = sorted(
+        (row[:4] + provider_names[row[4]] for row in rows if row[4] in provider_names),
+        key=lambda row: row[3]
+    )
     
-    conn.close()
+    receivers_list = sorted(scatter_rows("SELECT receiver_id, name, type FROM receivers"),
+                            key=lambda row: row[1])
     
     return render_template('add_claim.html', food_items=available_food, receivers=receivers_list)
 
@@ -416,7 +410,13 @@ def update_claim_status(claim_id):
     """Update claim status"""
     new_status = request.form['status']
     
-    conn = sqlite3.connect('food_wastage.db')
+    try:
+        shard = shard_for_id(claim_id)
+    except KeyError:
+        flash('Claim not found!', 'error')
+        return redirect(url_for('claims'))
+    
+    conn = shard.connect()
     cursor = conn.cursor()
     
     cursor.execute("UPDATE claims SET status = ? WHERE claim_id = ?", (new_status, claim_id))
@@ -443,85 +443,148 @@ def update_claim_status(claim_id):
 
 @app.route('/analytics')
 def analytics():
-    """Analytics dashboard"""
-    conn = sqlite3.connect('food_wastage.db')
-    cursor = conn.cursor()
-    
-    # Claims by status
-    cursor.execute("""
-        SELECT status, COUNT(*) as count
-        FROM claims
-        GROUP BY status
-    """)
-    claims_by_status = dict(cursor.fetchall())
-    
-    # Food types distribution
-    cursor.execute("""
-        SELECT food_type, COUNT(*) as count
-        FROM food_listings
-        GROUP BY food_type
-    """)
-    food_types_dist = dict(cursor.fetchall())
-    
-    # Provider types distribution
-    cursor.execute("""
-        SELECT type, COUNT(*) as count
-        FROM providers
-        GROUP BY type
-    """)
-    provider_types_dist = dict(cursor.fetchall())
-    
-    # Receiver types distribution
-    cursor.execute("""
-        SELECT type, COUNT(*) as count
-        FROM receivers
-        GROUP BY type
-    """)
-    receiver_types_dist = dict(cursor.fetchall())
-    
-    # Food waste prevention metrics
-    cursor.execute("""
-        SELECT 
-            SUM(CASE WHEN c.status = 'Completed' THEN f.quantity ELSE 0 END) as saved,
-            SUM(CASE WHEN c.status = 'Cancelled' THEN f.quantity ELSE 0 END) as cancelled,
-            SUM(f.quantity) as total
-        FROM claims c
-        JOIN food_listings f ON c.food_id = f.food_id
-    """)
-    waste_metrics = cursor.fetchone()
-    
-    # Monthly trends (last 6 months)
-    cursor.execute("""
-        SELECT 
-            strftime('%Y-%m', timestamp) as month,
-            COUNT(*) as claims_count
-        FROM claims
-        WHERE timestamp >= date('now', '-6 months')
-        GROUP BY strftime('%Y-%m', timestamp)
-        ORDER BY month
-    """)
-    monthly_trends = dict(cursor.fetchall())
-    
-    conn.close()
-    
-    analytics_data = {
-        'claims_by_status': claims_by_status,
-        'food_types_dist': food_types_dist,
-        'provider_types_dist': provider_types_dist,
-        'receiver_types_dist': receiver_types_dist,
-        'waste_metrics': {
-            'saved': waste_metrics[0] or 0,
-            'cancelled': waste_metrics[1] or 0,
-            'total': waste_metrics[2] or 0
-        },
-        'monthly_trends': monthly_trends
+    """Analytics dashboard (chart data is loaded from /api/chart_data)"""
+    return render_template('analytics.html')
+
+# Every analytics series in one pass: claims joined to their food once,
+# plus one grouped scan of each of the other tables. Claim timestamps are
+# normalised first because the seed data stores them as M/D/YYYY H:MM.
+CHART_DATA_QUERY = """
+    SELECT 'claims', c.status, strftime('%Y-%m', c.timestamp),
+           c.timestamp >= COALESCE(:start, date('now', '-6 months')),
+           COUNT(*), SUM(f.quantity)
+    FROM (SELECT food_id, status, iso_timestamp(timestamp) AS timestamp FROM claims) c
+    LEFT JOIN food_listings f ON c.food_id = f.food_id
+    WHERE (:start IS NULL OR c.timestamp >= :start)
+      AND (:end IS NULL OR c.timestamp < date(:end, '+1 day'))
+    GROUP BY 2, 3, 4
+    UNION ALL
+    SELECT 'food_types', food_type, NULL, NULL, COUNT(*), NULL
+    FROM food_listings
+    GROUP BY food_type
+    UNION ALL
+    SELECT 'provider_types', type, NULL, NULL, COUNT(*), NULL
+    FROM providers
+    GROUP BY type
+    UNION ALL
+    SELECT 'receiver_types', type, NULL, NULL, COUNT(*), NULL
+    FROM receivers
+    GROUP BY type
+"""
+
+def to_columns(counts):
+    """Turn a {label: count} dict into columnar chart data, ordered by label"""
+    items = sorted(counts.items(), key=lambda item: (item[0] is not None, item[0] or ''))
+    return {
+        'labels': [label for label, _ in items],
+        'values': [value for _, value in items]
     }
+
+def build_chart_data(start, end):
+    """Compute all analytics series for a date range"""
+    series = {
+        'claims_by_status': {},
+        'food_types': {},
+        'provider_types': {},
+        'receiver_types': {},
+        'monthly_trends': {}
+    }
+    waste_metrics = {'saved': 0, 'cancelled': 0, 'total': 0}
     
-    return render_template('analytics.html', data=analytics_data)
+    rows = scatter_rows(CHART_DATA_QUERY, {'start': start, 'end': end})
+    for name, label, month, in_trend, count, quantity in rows:
+        if name != 'claims':
+            series[name][label] = series[name].get(label, 0) + count
+            continue
+        
+        claims_by_status = series['claims_by_status']
+        claims_by_status[label] = claims_by_status.get(label, 0) + count
+        
+        # Food waste prevention metrics
+        quantity = quantity or 0
+        waste_metrics['total'] += quantity
+        if label == 'Completed':
+            waste_metrics['saved'] += quantity
+        elif label == 'Cancelled':
+            waste_metrics['cancelled'] += quantity
+        
+        # Monthly trends (last 6 months unless a start date is given)
+        if in_trend:
+            series['monthly_trends'][month] = series['monthly_trends'].get(month, 0) + count
+    
+    return {
+        'success': True,
+        'range': {'start': start, 'end': end},
+        'series': {name: to_columns(counts) for name, counts in series.items()},
+        'waste_metrics': waste_metrics
+    }
+
+@app.route('/api/chart_data')
+def api_chart_data():
+    """API endpoint for all analytics chart data
+
+    Accepts optional ``start`` and ``end`` dates (YYYY-MM-DD, inclusive)
+    which limit the claim-based series. Responses are cached until the
+    database files change and carry an ETag, so unchanged data is
+    answered with 304.
+    """
+    dates = []
+    for name in ('start', 'end'):
+        value = request.args.get(name) or None
+        if value is not None:
+            # Zero-pad so the value compares correctly against ISO timestamps
+            try:
+                value = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Dates must be in YYYY-MM-DD format'})
+        dates.append(value)
+    start, end = dates
+    
+    # The default trend window moves with the (UTC) date SQLite uses for 'now'
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    version = data_token()
+    cache_key = (version, start, end, today)
+    
+    payload = chart_cache.get(cache_key)
+    if payload is None:
+        payload = build_chart_data(start, end)
+        payload['version'] = version
+        with chart_cache_lock:
+            if len(chart_cache) >= CHART_CACHE_SIZE:
+                chart_cache.clear()
+            chart_cache[cache_key] = payload
+    
+    response = jsonify(payload)
+    response.set_etag(hashlib.sha1(repr(cache_key).encode()).hexdigest())
+    return response.make_conditional(request)
+
+# Query features whose results depend on seeing every row at once, which a
+# per-shard query cannot do
+CROSS_SHARD_PATTERNS = [
+    r'\bJOIN\b',
+    r'\bFROM\s+\w+(\s+(AS\s+)?\w+)?\s*,',
+    r'\(\s*SELECT\b',
+    r'\bUNION\b',
+    r'\bGROUP\s+BY\b',
+    r'\b(COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\s*\(',
+    r'\bDISTINCT\b',
+    r'\bORDER\s+BY\b',
+    r'\bLIMIT\b'
+]
+
+def is_cross_shard_query(query):
+    """Whether a query would give wrong results when run shard by shard"""
+    query_upper = query.upper()
+    return PARTITIONED and any(re.search(pattern, query_upper) for pattern in CROSS_SHARD_PATTERNS)
 
 @app.route('/analytics/custom-query', methods=['POST'])
 def custom_query():
-    """Execute custom SQL query"""
+    """Execute custom SQL query
+
+    In partitioned mode the query runs on every shard and the rows are
+    concatenated, so only single-table queries without joins, aggregates,
+    ordering or limits are accepted.
+    """
     try:
         query = request.form.get('query', '').strip()
         
@@ -539,19 +602,26 @@ def custom_query():
             if keyword in query_upper:
                 return jsonify({'success': False, 'error': f'Keyword "{keyword}" is not allowed'})
         
-        conn = sqlite3.connect('food_wastage.db')
-        cursor = conn.cursor()
-        
-        # Execute the query
-        cursor.execute(query)
+        if is_cross_shard_query(query):
+            return jsonify({
+                'success': False,
+                'error': 'Partitioned mode only supports single-table queries without joins, '
+                         'subqueries, aggregates, DISTINCT, ORDER BY or LIMIT'
+            })
         
-        # Get column names
-        columns = [description[0] for description in cursor.description] if cursor.description else []
-        
-        # Fetch results
-        results = cursor.fetchall()
+        def run_query(cursor):
+            # Execute the query
+            cursor.execute(query)
+            
+            # Get column names
+            columns = [description[0] for description in cursor.description] if cursor.description else []
+            
+            # Fetch results
+            return columns, cursor.fetchall()
         
-        conn.close()
+        shard_results = scatter(run_query)
+        columns = shard_results[0][0] if shard_results else []
+        results = [row for _, rows in shard_results for row in rows]
         
         # Format results for display
         formatted_results = []
@@ -572,7 +642,7 @@ def custom_query():
 
 @app.route('/analytics/query-suggestions')
 def query_suggestions():
-    """Get suggested queries for users"""
+    """Get suggested queries for users (only those valid in the current mode)"""
     suggestions = [
         {
             'title': 'Total Food Items by Provider Type',
@@ -607,73 +677,80 @@ def query_suggestions():
             'query': 'SELECT AVG(julianday(date("now")) - julianday(date(timestamp))) as avg_response_days FROM claims WHERE status != "Pending";'
         }
     ]
+    suggestions = [suggestion for suggestion in suggestions if not is_cross_shard_query(suggestion['query'])]
     
     return jsonify({'success': True, 'suggestions': suggestions})
 
 @app.route('/api/urgent_food')
 def api_urgent_food():
     """API endpoint for urgent food items"""
-    conn = sqlite3.connect('food_wastage.db')
-    cursor = conn.cursor()
-    
     days_threshold = request.args.get('days', 3)
     threshold_date = (datetime.now() + timedelta(days=int(days_threshold))).strftime('%Y-%m-%d')
     
-    cursor.execute("""
-        SELECT f.food_id, f.food_name, f.quantity, f.expiry_date, 
-               p.name as provider_name, p.contact
+    rows = scatter_rows("""
+        SELECT f.food_id, f.food_name, f.quantity, f.expiry_date, f.provider_id
         FROM food_listings f
-        JOIN providers p ON f.provider_id = p.provider_id
         WHERE f.expiry_date <= ? AND f.status = 'Available'
-        ORDER BY f.expiry_date
     """, (threshold_date,))
+    providers_by_id = fetch_by_ids('providers', 'provider_id', [row[4] for row in rows], ['name', 'contact'])
     
     urgent_items = []
-    for row in cursor.fetchall():
+    for row in sorted(rows, key=lambda row: row[3]):
+        if row[4] not in providers_by_id:
+            continue
+        provider_name, provider_contact = providers_by_id[row[4]]
         urgent_items.append({
             'food_id': row[0],
             'food_name': row[1],
             'quantity': row[2],
             'expiry_date': row[3],
-            'provider_name': row[4],
-            'provider_contact': row[5]
+            'provider_name': provider_name,
+            'provider_contact': provider_contact
         })
     
-    conn.close()
     return jsonify(urgent_items)
 
 @app.route('/api/dashboard_stats')
 def api_dashboard_stats():
     """API endpoint for dashboard statistics"""
-    conn = sqlite3.connect('food_wastage.db')
-    cursor = conn.cursor()
-    
-    # Get various statistics
-    stats = {}
-    
-    # Daily claims for the last 7 days
-    cursor.execute("""
-        SELECT DATE(timestamp) as date, COUNT(*) as count
-        FROM claims
-        WHERE timestamp >= date('now', '-7 days')
-        GROUP BY DATE(timestamp)
-        ORDER BY date
-    """)
-    daily_claims = dict(cursor.fetchall())
+    def shard_stats(cursor):
+        # Daily claims for the last 7 days
+        cursor.execute("""
+            SELECT DATE(timestamp) as date, COUNT(*) as count
+            FROM claims
+            WHERE timestamp >= date('now', '-7 days')
+            GROUP BY DATE(timestamp)
+        """)
+        daily_claims = cursor.fetchall()
+        
+        # Claim outcomes per provider, typed once providers are resolved
+        cursor.execute("""
+            SELECT f.provider_id,
+                   COUNT(*) as total_claims,
+                   SUM(CASE WHEN c.status = 'Completed' THEN 1 ELSE 0 END) as completed_claims
+            FROM claims c
+            JOIN food_listings f ON c.food_id = f.food_id
+            GROUP BY f.provider_id
+        """)
+        return daily_claims, cursor.fetchall()
+    
+    results = scatter(shard_stats)
+    daily_claims = dict(sorted(merge_counts(daily for daily, _ in results).items(),
+                               key=lambda item: item[0] or ''))
     
     # Success rate by provider type
-    cursor.execute("""
-        SELECT p.type,
-               COUNT(*) as total_claims,
-               SUM(CASE WHEN c.status = 'Completed' THEN 1 ELSE 0 END) as completed_claims
-        FROM claims c
-        JOIN food_listings f ON c.food_id = f.food_id
-        JOIN providers p ON f.provider_id = p.provider_id
-        GROUP BY p.type
-    """)
+    provider_rows = [row for _, rows in results for row in rows]
+    provider_types = fetch_by_ids('providers', 'provider_id', [row[0] for row in provider_rows], ['type'])
+    totals_by_type = {}
+    for provider_id, total, completed in provider_rows:
+        if provider_id not in provider_types:
+            continue
+        totals = totals_by_type.setdefault(provider_types[provider_id][0], [0, 0])
+        totals[0] += total
+        totals[1] += completed
+    
     provider_success = {}
-    for row in cursor.fetchall():
-        provider_type, total, completed = row
+    for provider_type, (total, completed) in sorted(totals_by_type.items(), key=lambda item: item[0] or ''):
         success_rate = (completed / total * 100) if total > 0 else 0
         provider_success[provider_type] = {
             'total': total,
@@ -681,8 +758,6 @@ def api_dashboard_stats():
             'success_rate': round(success_rate, 1)
         }
     
-    conn.close()
-    
     stats = {
         'daily_claims': daily_claims,
         'provider_success': provider_success
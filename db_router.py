@@ -0,0 +1,413 @@
+"""Database routing for the Food Wastage Management System.
+
+By default everything lives in a single SQLite file (``food_wastage.db``).
+Setting ``FOOD_WASTAGE_PARTITIONED=1`` switches to partitioned mode, where
+providers and receivers (by ``city``), food listings (by ``location``) and
+claims (with the listing they claim) are stored in one SQLite file per region
+under ``FOOD_WASTAGE_SHARD_FOLDER``. Cities are hashed into
+``FOOD_WASTAGE_REGIONS`` regions so the number of files stays bounded. The
+main database file then only holds the shard catalog.
+
+Ids in partitioned mode encode their shard: ``id % SHARD_ID_STRIDE`` is the
+shard number, so any row can be routed from its id alone.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DATABASE = 'food_wastage.db'
+PARTITIONED = os.environ.get('FOOD_WASTAGE_PARTITIONED', '0') == '1'
+SHARD_FOLDER = os.environ.get('FOOD_WASTAGE_SHARD_FOLDER', 'shards')
+REGIONS = int(os.environ.get('FOOD_WASTAGE_REGIONS', '16'))
+SHARD_ID_STRIDE = 10000
+
+# Timestamp layouts found in the data: ISO from SQLite, M/D/YYYY from the CSVs
+TIMESTAMP_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                     '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%m/%d/%Y']
+
+# SQLite's default limit on bound parameters is 999 on older builds
+MAX_IN_PARAMS = 500
+
+
+class Shard:
+    """A single SQLite file holding rows for one region (or everything)"""
+
+    def __init__(self, number, path):
+        self.number = number
+        self.path = path
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.create_function('iso_timestamp', 1, iso_timestamp, deterministic=True)
+        return conn
+
+
+def iso_timestamp(value):
+    """Normalise a stored timestamp to ``YYYY-MM-DD HH:MM:SS`` for comparisons
+
+    Registered as an SQL function on every shard connection. Values in an
+    unknown layout are returned unchanged.
+    """
+    if value is None:
+        return None
+    for timestamp_format in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, timestamp_format).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    return value
+
+
+MAIN_SHARD = Shard(0, DATABASE)
+
+_shards_by_region = {}
+_shards_by_number = {}
+_catalog_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=8)
+
+
+def create_tables(cursor):
+    """Create the application tables on a database cursor"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS providers (
+            provider_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            address TEXT,
+            city TEXT,
+            contact TEXT,
+            email TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS receivers (
+            receiver_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            city TEXT,
+            contact TEXT,
+            email TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS food_listings (
+            food_id INTEGER PRIMARY KEY,
+            food_name TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            expiry_date DATE NOT NULL,
+            provider_id INTEGER,
+            provider_type TEXT,
+            location TEXT,
+            food_type TEXT,
+            meal_type TEXT,
+            description TEXT,
+            status TEXT DEFAULT 'Available',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (provider_id) REFERENCES providers (provider_id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS claims (
+            claim_id INTEGER PRIMARY KEY,
+            food_id INTEGER,
+            receiver_id INTEGER,
+            status TEXT DEFAULT 'Pending',
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            notes TEXT,
+            FOREIGN KEY (food_id) REFERENCES food_listings (food_id),
+            FOREIGN KEY (receiver_id) REFERENCES receivers (receiver_id)
+        )
+    ''')
+
+
+def init_catalog():
+    """Create the shard catalog in the main database and load it"""
+    os.makedirs(SHARD_FOLDER, exist_ok=True)
+    conn = sqlite3.connect(DATABASE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS shards (
+            shard_id INTEGER PRIMARY KEY,
+            region_key TEXT UNIQUE NOT NULL
+        )
+    ''')
+    conn.commit()
+    conn.close()
+    _reload_catalog()
+
+
+def _reload_catalog():
+    conn = sqlite3.connect(DATABASE)
+    cursor = conn.cursor()
+    cursor.execute("SELECT shard_id, region_key FROM shards")
+    rows = cursor.fetchall()
+    conn.close()
+
+    for number, key in rows:
+        if number not in _shards_by_number:
+            _register_shard(number, key)
+
+
+def _shard_path(number):
+    return os.path.join(SHARD_FOLDER, f'shard_{number:04d}.db')
+
+
+def _create_shard_tables(shard):
+    conn = shard.connect()
+    create_tables(conn.cursor())
+    conn.commit()
+    conn.close()
+
+
+def _register_shard(number, key):
+    """Cache a catalogued shard, making sure its tables exist first
+
+    The tables are created again here (idempotently) in case the process
+    that catalogued the shard died before creating them.
+    """
+    shard = Shard(number, _shard_path(number))
+    _create_shard_tables(shard)
+    with _catalog_lock:
+        _shards_by_number[number] = shard
+        _shards_by_region[key] = shard
+    return shard
+
+
+def region_key(city):
+    """Map a city name onto one of the ``REGIONS`` region keys
+
+    Changing ``REGIONS`` only affects where new rows go: existing rows
+    keep routing by their id.
+    """
+    city = (city or '').strip().lower()
+    return f'region_{zlib.crc32(city.encode()) % REGIONS:04d}'
+
+
+def shard_for_city(city):
+    """Return the shard for a city's region, creating it on first use"""
+    if not PARTITIONED:
+        return MAIN_SHARD
+
+    key = region_key(city)
+    shard = _shards_by_region.get(key)
+    if shard is not None:
+        return shard
+
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    cursor = conn.cursor()
+    cursor.execute("INSERT OR IGNORE INTO shards (region_key) VALUES (?)", (key,))
+    cursor.execute("SELECT shard_id FROM shards WHERE region_key = ?", (key,))
+    number = cursor.fetchone()[0]
+
+    if number >= SHARD_ID_STRIDE:
+        conn.rollback()
+        conn.close()
+        raise RuntimeError(f'Too many shards: raise SHARD_ID_STRIDE above {SHARD_ID_STRIDE}')
+
+    # Create the shard's tables before the catalog row becomes visible, so
+    # no reader can route a query to an empty file
+    try:
+        shard = Shard(number, _shard_path(number))
+        _create_shard_tables(shard)
+        conn.commit()
+    finally:
+        conn.close()
+
+    with _catalog_lock:
+        _shards_by_number[number] = shard
+        _shards_by_region[key] = shard
+    return shard
+
+
+def _lookup_shard(entity_id):
+    if not PARTITIONED:
+        return MAIN_SHARD
+
+    number = int(entity_id) % SHARD_ID_STRIDE
+    shard = _shards_by_number.get(number)
+    if shard is None:
+        # Another process may have created the shard since we last looked
+        _reload_catalog()
+        shard = _shards_by_number.get(number)
+    return shard
+
+
+def shard_for_id(entity_id):
+    """Return the shard holding the row with this id"""
+    shard = _lookup_shard(entity_id)
+    if shard is None:
+        raise KeyError(f'No shard holds id {entity_id}')
+    return shard
+
+
+def all_shards():
+    """Return every shard that currently holds data"""
+    if not PARTITIONED:
+        return [MAIN_SHARD]
+
+    # Pick up shards other processes have created since we last looked
+    _reload_catalog()
+    return sorted(_shards_by_number.values(), key=lambda shard: shard.number)
+
+
+def data_token():
+    """Return a token that changes whenever any shard is written to
+
+    Reads SQLite's file change counter from each database header. Every
+    committed write transaction bumps it, whichever process made it.
+    """
+    counters = []
+    for shard in all_shards():
+        try:
+            with open(shard.path, 'rb') as db_file:
+                db_file.seek(24)
+                counters.append((shard.number, int.from_bytes(db_file.read(4), 'big')))
+        except FileNotFoundError:
+            counters.append((shard.number, None))
+    return hashlib.sha1(repr(counters).encode()).hexdigest()[:16]
+
+
+def _run(shard, task):
+    conn = shard.connect()
+    try:
+        return task(conn.cursor())
+    finally:
+        conn.close()
+
+
+def _run_all(jobs):
+    """Run ``(shard, task)`` pairs, in parallel when there is more than one"""
+    if len(jobs) == 1:
+        return [_run(*jobs[0])]
+    return list(_executor.map(lambda job: _run(*job), jobs))
+
+
+def scatter(task, shards=None):
+    """Call ``task(cursor)`` on every shard in parallel and return the results"""
+    if shards is None:
+        shards = all_shards()
+    return _run_all([(shard, task) for shard in shards])
+
+
+def scatter_rows(query, params=()):
+    """Run a read query on every shard and concatenate the rows"""
+    def task(cursor):
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+    return [row for rows in scatter(task) for row in rows]
+
+
+def fetch_by_ids(table, key_column, ids, columns):
+    """Fetch ``columns`` for the given ids, wherever they live
+
+    Returns a dict mapping each id found to a tuple of the column values.
+    """
+    ids_by_shard = {}
+    for entity_id in set(ids):
+        if entity_id is None:
+            continue
+        shard = _lookup_shard(entity_id)
+        if shard is not None:
+            ids_by_shard.setdefault(shard, []).append(entity_id)
+
+    def make_task(shard_ids):
+        def task(cursor):
+            rows = []
+            for start in range(0, len(shard_ids), MAX_IN_PARAMS):
+                chunk = shard_ids[start:start + MAX_IN_PARAMS]
+                placeholders = ', '.join('?' * len(chunk))
+                cursor.execute(
+                    f"SELECT {key_column}, {', '.join(columns)} FROM {table} "
+                    f"WHERE {key_column} IN ({placeholders})",
+                    chunk,
+                )
+                rows.extend(cursor.fetchall())
+            return rows
+        return task
+
+    jobs = [(shard, make_task(shard_ids)) for shard, shard_ids in ids_by_shard.items()]
+    if not jobs:
+        return {}
+    return {row[0]: row[1:] for rows in _run_all(jobs) for row in rows}
+
+
+def insert_row(cursor, shard, table, key_column, values):
+    """Insert a row into ``table`` on ``shard`` and return its new id
+
+    In partitioned mode the id is allocated so that it routes back to
+    ``shard``; otherwise SQLite assigns it as usual.
+    """
+    columns = ', '.join(values)
+    placeholders = ', '.join('?' * len(values))
+
+    if shard is MAIN_SHARD:
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+            tuple(values.values()),
+        )
+    else:
+        cursor.execute(
+            f"INSERT INTO {table} ({key_column}, {columns}) "
+            f"SELECT COALESCE(MAX({key_column}) + ?, ?), {placeholders} FROM {table}",
+            (SHARD_ID_STRIDE, shard.number) + tuple(values.values()),
+        )
+    return cursor.lastrowid
+
+
+def load_partitioned(providers_df, receivers_df, food_listings_df, claims_df):
+    """Split the seed data across region shards
+
+    Ids from the CSV files are re-keyed so that they route to their shard,
+    and foreign keys are rewritten to match.
+    """
+    providers_df = providers_df.rename(columns=str.lower)
+    receivers_df = receivers_df.rename(columns=str.lower)
+    food_listings_df = food_listings_df.rename(columns=str.lower)
+    claims_df = claims_df.rename(columns=str.lower)
+
+    def rekey(df, key_column, numbers):
+        new_ids = df.groupby(numbers).cumcount() * SHARD_ID_STRIDE + numbers
+        id_map = dict(zip(df[key_column], new_ids))
+        return df.assign(**{key_column: new_ids}), id_map
+
+    def numbers_for(cities):
+        return cities.map(lambda city: shard_for_city(city).number)
+
+    provider_numbers = numbers_for(providers_df['city'])
+    providers_df, provider_ids = rekey(providers_df, 'provider_id', provider_numbers)
+
+    receiver_numbers = numbers_for(receivers_df['city'])
+    receivers_df, receiver_ids = rekey(receivers_df, 'receiver_id', receiver_numbers)
+
+    food_numbers = numbers_for(food_listings_df['location'])
+    food_listings_df, food_ids = rekey(food_listings_df, 'food_id', food_numbers)
+    food_listings_df['provider_id'] = food_listings_df['provider_id'].map(provider_ids).astype('Int64')
+
+    # Claims live with the listing they claim
+    claims_df = claims_df[claims_df['food_id'].isin(list(food_ids))].copy()
+    claims_df['food_id'] = claims_df['food_id'].map(food_ids)
+    claims_df['receiver_id'] = claims_df['receiver_id'].map(receiver_ids).astype('Int64')
+    claim_numbers = claims_df['food_id'] % SHARD_ID_STRIDE
+    claims_df, _ = rekey(claims_df, 'claim_id', claim_numbers)
+
+    frames = [
+        ('providers', providers_df, provider_numbers),
+        ('receivers', receivers_df, receiver_numbers),
+        ('food_listings', food_listings_df, food_numbers),
+        ('claims', claims_df, claim_numbers),
+    ]
+    for number, shard in _shards_by_number.items():
+        conn = shard.connect()
+        for table, df, numbers in frames:
+            df[numbers == number].to_sql(table, conn, if_exists='append', index=False)
+        conn.close()